@@ -1,8 +1,13 @@
 #!/usr/bin/env python3
 
-from collections import Counter
-from typing import Dict, Iterator, Tuple
+from collections import Counter, defaultdict
+from itertools import product, repeat
+from operator import lshift, or_
+from typing import DefaultDict, Dict, Iterator, List, Tuple, Union
 import argparse
+import mmap
+import multiprocessing
+import os
 import sys
 
 """
@@ -10,93 +15,529 @@ fasta_kmer_counter.py
 
 Create a k-mer table (default k=3) from a DNA FASTA file.
 
-Uses Biopython's SeqIO if available (install via bioconda: biopython).
+Uses Biopython's SimpleFastaParser if available (install via bioconda: biopython).
 Falls back to a minimal FASTA parser if Biopython is not installed.
 
 Script overview:
-main script runs the build_kmer_table function to create kmer table, using the parse_fasta function defined here using biopython's SeqIO function to read the FASTA file.
+main script runs the build_kmer_table function to create kmer table, using the parse_fasta function defined here using biopython's SimpleFastaParser function to read the FASTA file.
 Then the write_kmer_table function loops through the table and prints the kmer counts.
 """
 
-# Prefer SeqIO from Biopython (available in Bioconda). Fall back to a simple parser.
+# Prefer SimpleFastaParser from Biopython (available in Bioconda). Fall back to a simple parser.
 try:
-    #import SeqIO from biopython to read in the fasta file
-    from Bio import SeqIO  # type: ignore
+    #import SimpleFastaParser from biopython to read in the fasta file. It yields plain strings instead of building a SeqRecord per entry.
+    from Bio.SeqIO.FastaIO import SimpleFastaParser  # type: ignore
 
     #parse_fasta will read through the fasta record by record.
     def parse_fasta(path: str) -> Iterator[Tuple[str, str]]:         
                                                                 
         """
-        FASTA parser using Biopython SeqIO. Header is the full description (no leading '>').
+        FASTA parser using Biopython SimpleFastaParser. Header is the full description (no leading '>').
         Yields (header, sequence) pairs.
         """
-        for rec in SeqIO.parse(path, "fasta"):
-            yield rec.description, str(rec.seq)
+        with open(path) as fh:
+            yield from SimpleFastaParser(fh)
 
 except Exception:
 
-    def parse_fasta(path: str) -> Iterator[Tuple[str, str]]:
+    #files smaller than this are read into memory with a single read() call instead of being memory-mapped.
+    READ_WHOLE_MAX = 256 * 1024 * 1024
+
+    def _parse_fasta_buffer(buf) -> Iterator[Tuple[str, bytes]]:
+        """
+        Yield (header, sequence) for each entry of a FASTA file held in bytes or an mmap.
+        The sequence is returned as bytes with line breaks and spaces removed.
+        """
+        #start points at the '>' of the current record; anything before the first record is ignored.
+        if buf[:1] == b">":
+            start = 0
+        else:
+            start = buf.find(b"\n>")
+            if start < 0:
+                return
+            start += 1
+        while True:
+            nxt = buf.find(b"\n>", start) #newline that ends this record, or -1 for the last record.
+            end = nxt if nxt >= 0 else len(buf)
+            header_end = buf.find(b"\n", start, end)
+            if header_end < 0: #header line with no sequence lines after it.
+                header_end = end
+            header = buf[start + 1 : header_end].decode("ascii", "replace").strip()
+            yield header, buf[header_end + 1 : end].translate(None, b" \t\r\n")
+            if nxt < 0:
+                break
+            start = nxt + 1
+
+    def parse_fasta(path: str) -> Iterator[Tuple[str, bytes]]:
         """
         Simple FASTA parser that yields (header, sequence) for each entry.
-        Header does not include the leading '>'.
+        Header does not include the leading '>'. The file is read in one call (or memory-mapped
+        if it is large) and the sequence is returned as bytes with line breaks and spaces removed.
         """
         print("Warning: Biopython not found, using fallback FASTA parser.", file=sys.stderr)
-        header = None
-        seq_parts = []
-        with open(path, "r") as fh:
-            for line in fh:
-                line = line.rstrip("\n")
-                if not line:
-                    continue
-                if line.startswith(">"):
-                    if header is not None:
-                        yield header, "".join(seq_parts)
-                    header = line[1:].strip()
-                    seq_parts = []
-                else:
-                    seq_parts.append(line.strip())
-            if header is not None:
-                yield header, "".join(seq_parts)
+        with open(path, "rb") as fh:
+            size = os.fstat(fh.fileno()).st_size
+            if size == 0: #an empty file cannot be memory-mapped.
+                return
+            if size < READ_WHOLE_MAX:
+                yield from _parse_fasta_buffer(fh.read())
+            else:
+                with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    yield from _parse_fasta_buffer(mm)
+
+
+# NumPy is optional. When it is installed, small k-mer sizes are counted with vectorized bincount.
+try:
+    import numpy as np  # type: ignore
+except Exception:
+    np = None
+
+# Numba is optional too. When it is installed (with NumPy), larger k-mer sizes are counted by a compiled loop.
+try:
+    import numba  # type: ignore
+except Exception:
+    numba = None
+
+
+#lookup table for bytes.translate that turns each base into its 2-bit code (A=0, C=1, G=2, T=3).
+#Lower case bases get the same codes, so sequences never need an upper() copy.
+#Every other byte becomes INVALID, which marks a non-standard base.
+INVALID = 255
+ENCODE = bytearray([INVALID]) * 256
+for _code, _base in enumerate(b"ACGT"):
+    ENCODE[_base] = _code
+    ENCODE[_base + 32] = _code #lower case letter
+ENCODE = bytes(ENCODE)
+INVALID_BYTE = bytes([INVALID])
+
+#largest k counted into a dense int64 array of all 4**k possible kmers (4**12 is ~16M counts, 128 MB).
+#Indexing the array needs no hashing, unlike a dict.
+DENSE_MAX_K = 12
+
+
+#largest k counted by chaining map() over shifted copies of each run in _count_python. Each extra base
+#adds two C calls per kmer, so for larger k the rolling Python loop is faster.
+MAP_MAX_K = 2
+
+#largest k for which _count_python uses defaultdict's += 1. While most kmers are already in the table
+#that is faster than dict.get, but once most kmers are new (larger k) the call to int() for each one makes it slower.
+INCREMENT_MAX_K = 7
+
+
+def _count_python(codes: bytes, k: int, total: DefaultDict[int, int]):
+    """
+    Add the kmers of one encoded sequence to total (a defaultdict(int)), one base at a time.
+    """
+    #mask keeps only the last k bases (2 bits each) of the rolling key.
+    mask = (1 << (2 * k)) - 1
+    get = total.get
+    #non-standard bases are skipped when they occur inside a k-mer, so split the sequence at them
+    #and roll the key through each run of valid bases with no per-base checks.
+    for run in codes.split(INVALID_BYTE):
+        if len(run) < k:
+            continue
+        if k <= MAP_MAX_K:
+            #build each kmer's key from k shifted copies of the run and let Counter count them, all in C.
+            keys = run
+            for j in range(1, k):
+                keys = map(or_, map(lshift, keys, repeat(2)), run[j:])
+            for key, count in Counter(keys).items():
+                total[key] += count
+            continue
+        key = 0
+        for code in run[: k - 1]: #first k-1 bases of the run only start the key.
+            key = (key << 2) | code
+        if k <= INCREMENT_MAX_K:
+            for code in run[k - 1 :]:
+                key = ((key << 2) | code) & mask #shift the newest base onto the end of the key.
+                total[key] += 1
+        else:
+            for code in run[k - 1 :]:
+                key = ((key << 2) | code) & mask
+                total[key] = get(key, 0) + 1
+
+
+#number of kmers _count_dense handles per pass, few enough for its temporary arrays to stay in the CPU cache.
+DENSE_WINDOW = 1 << 16
+
+
+def _count_dense(codes: bytes, k: int, counts):
+    """
+    Add the kmers of one encoded sequence to the dense NumPy array counts (length 4**k).
+    """
+    a = np.frombuffer(codes, np.uint8)
+    #long sequences are counted one window at a time. Windows overlap by k-1 bases, so each kmer is counted once.
+    for start in range(0, a.size - k + 1, DENSE_WINDOW):
+        _count_dense_window(a[start : start + DENSE_WINDOW + k - 1], k, counts)
+
+
+def _count_dense_window(a, k: int, counts):
+    """
+    Add the kmers of a uint8 array of codes to counts, all at once with NumPy.
+    """
+    n = a.size - k + 1 #number of kmer windows in the array.
+    if n <= 0:
+        return
+    #build every window's key at once. Keys of width 2h are two width-h keys side by side, so doubling
+    #the width each pass needs about log2(k) passes instead of one pass per base. uint32 holds any dense key.
+    idx = a.astype(np.uint32)
+    width = 1
+    while 2 * width <= k:
+        idx = (idx[: idx.size - width] << np.uint32(2 * width)) | idx[width:]
+        width *= 2
+    rest = k - width
+    if rest: #finish with the last rest bases, which are the low bits of the width-long key ending the window.
+        idx = (idx[:n] << np.uint32(2 * rest)) | (idx[rest : rest + n] & np.uint32((1 << (2 * rest)) - 1))
+    #a window is valid when it holds no INVALID bytes, i.e. the running count of invalid bytes does not change across it.
+    bad = np.concatenate(([0], np.cumsum(a == INVALID)))
+    valid = bad[k:] == bad[:n]
+    if n < counts.size: #short sequence: add in place rather than building a whole 4**k bincount array.
+        np.add.at(counts, idx[valid], 1)
+    else:
+        counts += np.bincount(idx[valid], minlength=counts.size)
+
+
+#largest k whose packed key fits in a 64-bit integer, as used by the compiled loop and NumPy.
+JIT_MAX_K = 32
+
+
+if numba is not None and np is not None:
+
+    @numba.njit(cache=True)
+    def _count_jit(a, k, mask, total):
+        """
+        Compiled version of _count_python over a uint8 array of codes, adding into a numba typed dict.
+        """
+        #the packed key is used as the dict key as is. Like CPython, the typed dict probes with the high
+        #bits of the hash, so near-sequential keys do not cluster and rehashing them (e.g. SplitMix64) only costs time.
+        key = np.uint64(0)
+        valid_run = 0
+        for i in range(a.size):
+            code = a[i]
+            if code == INVALID:
+                valid_run = 0
+                continue
+            key = ((key << np.uint64(2)) | np.uint64(code)) & mask
+            valid_run += 1
+            if valid_run >= k:
+                total[key] = total.get(key, 0) + 1
+
+    @numba.njit(cache=True)
+    def _jit_items(total):
+        """
+        Copy a typed dict filled by _count_jit into key and count arrays (much faster than iterating it from Python).
+        """
+        keys = np.empty(len(total), np.uint64)
+        counts = np.empty(len(total), np.int64)
+        i = 0
+        for key, count in total.items():
+            keys[i] = key
+            counts[i] = count
+            i += 1
+        return keys, counts
+
+    @numba.njit(cache=True)
+    def _merge_jit(total, keys, counts):
+        """
+        Add key and count arrays from _jit_items (e.g. from a worker process) into a typed dict.
+        """
+        for i in range(keys.size):
+            total[keys[i]] = total.get(keys[i], 0) + counts[i]
+
+    def _new_jit_table():
+        """
+        Empty numba typed dict (uint64 kmer key -> int64 count) for _count_jit.
+        """
+        return numba.typed.Dict.empty(key_type=numba.types.uint64, value_type=numba.types.int64)
+
+else:
+    _count_jit = None
+
+
+#records are joined into batches of about this many bytes, so many small records are counted in one call
+#of the counting loop. With more than one process, each batch is one task for a worker.
+BATCH_BYTES = 4 * 1024 * 1024
+
+
+def _counting_method(k: int) -> str:
+    """
+    Pick the fastest counting loop available: dense NumPy array for small k, compiled Numba loop, then plain Python.
+    """
+    if np is not None and k <= DENSE_MAX_K:
+        return "dense"
+    if _count_jit is not None and k <= JIT_MAX_K:
+        return "jit"
+    return "python"
+
+
+def _new_table(method: str, k: int):
+    """
+    Empty count table for the given counting method.
+    """
+    if method == "dense":
+        return np.zeros(4 ** k, np.int64)
+    if method == "jit":
+        return _new_jit_table()
+    return defaultdict(int)
+
+
+def _count_codes(codes: bytes, k: int, method: str, table):
+    """
+    Add the kmers of one encoded sequence to table using the given counting method.
+    """
+    if method == "dense":
+        _count_dense(codes, k, table)
+    elif method == "jit":
+        _count_jit(np.frombuffer(codes, np.uint8), k, np.uint64((1 << (2 * k)) - 1), table)
+    else:
+        _count_python(codes, k, table)
+
+
+def _sequences(fasta_path: str) -> Iterator[bytes]:
+    """
+    Yield each FASTA sequence as bytes (Biopython yields str, the fallback parser yields bytes).
+    """
+    for _, seq in parse_fasta(fasta_path):
+        if isinstance(seq, str):
+            seq = seq.encode("ascii", "replace")
+        yield seq
+
+
+def _batches(fasta_path: str) -> Iterator[Union[bytes, bytearray]]:
+    """
+    Join the FASTA sequences into single buffers of about BATCH_BYTES bytes.
+    Records are separated by an N, so no kmer spans two records. A record of BATCH_BYTES or more is yielded on its own, as is.
+    """
+    #each record is appended to the batch's bytearray as it is read, rather than held in a list until a join copies them all.
+    batch = bytearray()
+    for seq in _sequences(fasta_path):
+        if len(seq) >= BATCH_BYTES: #big record: hand it over without copying it into a batch.
+            if batch:
+                yield batch
+                batch = bytearray()
+            yield seq
+            continue
+        if batch:
+            batch += b"N"
+        batch += seq
+        if len(batch) >= BATCH_BYTES:
+            yield batch
+            batch = bytearray()
+    if batch:
+        yield batch
+
+
+def _count_batch(task: Tuple[Union[bytes, bytearray], int]):
+    """
+    Count the kmers of one batch of sequences in a worker process.
+    Returns a dense array, key and count arrays (Numba or a sparse dense table), or a dict, to be merged with _add_partial.
+    """
+    batch, k = task
+    method = _counting_method(k)
+    table = _new_table(method, k)
+    _count_codes(batch.translate(ENCODE), k, method, table)
+    if method == "jit": #typed dicts are not picklable, so send plain arrays back.
+        return _jit_items(table)
+    if method == "dense" and table.size > len(batch): #most of the array is empty: send back only the seen kmers.
+        seen = np.flatnonzero(table)
+        return seen, table[seen]
+    return table
+
+
+def _add_partial(table, partial, method: str):
+    """
+    Add the counts returned by _count_batch into table.
+    """
+    if method == "dense":
+        if isinstance(partial, tuple):
+            keys, counts = partial
+            table[keys] += counts #keys are distinct, so fancy-index addition is safe.
+        else:
+            table += partial
+    elif method == "jit":
+        _merge_jit(table, *partial)
+    else:
+        for key, count in partial.items():
+            table[key] += count
+
+
+#(shift, mask) steps that reverse the order of the 2-bit bases in a 64-bit key: swap neighbouring bases,
+#then pairs of bases, bytes, 16-bit and 32-bit halves.
+REVERSE_STEPS = (
+    (2, 0x3333333333333333),
+    (4, 0x0F0F0F0F0F0F0F0F),
+    (8, 0x00FF00FF00FF00FF),
+    (16, 0x0000FFFF0000FFFF),
+    (32, 0x00000000FFFFFFFF),
+)
+
+
+def revcomp_key(key, k: int):
+    """
+    Reverse complement of a 2-bit packed k-mer key. Also works on NumPy uint64 arrays of keys (k <= 32).
+    """
+    #the complement of a base is 3 - code (A<->T, C<->G), i.e. code ^ 3, so flipping every bit complements every base.
+    x = key ^ ((1 << (2 * k)) - 1)
+    if k > JIT_MAX_K: #too long for the 64-bit steps: reverse one base at a time.
+        rc = 0
+        for _ in range(k):
+            rc = (rc << 2) | (x & 3)
+            x >>= 2
+        return rc
+    for shift, mask in REVERSE_STEPS:
+        x = ((x >> shift) & mask) | ((x & mask) << shift)
+    return x >> (64 - 2 * k) #the k reversed bases now sit at the top of the 64 bits.
+
+
+def _canonical_arrays(keys, counts, k: int):
+    """
+    Fold key and count arrays onto canonical keys (the lesser of each key and its reverse complement).
+    Returns the canonical keys, sorted, and their summed counts.
+    """
+    keys = np.minimum(keys, revcomp_key(keys, k))
+    order = np.argsort(keys)
+    keys, counts = keys[order], counts[order]
+    starts = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1]))) #first position of each distinct key.
+    return keys[starts], np.add.reduceat(counts, starts)
+
+
+def canonicalize_table(table, k: int):
+    """
+    Merge the count of every k-mer with the count of its reverse complement, kept under whichever of the
+    two keys sorts first (so only canonical k-mers are written). Takes and returns a table from build_kmer_table.
+    """
+    if not isinstance(table, dict): #dense array: add the count at each seen position to its canonical position.
+        seen = np.flatnonzero(table)
+        canonical = np.minimum(seen, revcomp_key(seen.astype(np.uint64), k).astype(np.intp))
+        folded = np.zeros_like(table)
+        np.add.at(folded, canonical, table[seen])
+        return folded
+    if not table:
+        return table
+    if np is not None and k <= JIT_MAX_K:
+        keys = np.fromiter(table.keys(), np.uint64, len(table))
+        counts = np.fromiter(table.values(), np.int64, len(table))
+        keys, counts = _canonical_arrays(keys, counts, k)
+        return dict(zip(keys.tolist(), counts.tolist()))
+    folded = defaultdict(int)
+    for key, count in table.items():
+        folded[min(key, revcomp_key(key, k))] += count
+    return folded
 
 
 #Building the kmer table function
-#function build_kmer_table takes two arguments, the fasta path and the kmer size (default is 3). It defines the kmer size as 3 by default if no other value is provided. It inherits the fasta path from the 
-#main function at table = build_kmer_table(args.fasta, k=args.k) below where the first input is the fasta path specified by argparser variable "fasta" and the second input is the kmer size specified by argparser variable "k".
-def build_kmer_table(fasta_path: str, k: int = 3) -> Dict:
+#function build_kmer_table takes the fasta path, the kmer size (default is 3), the number of processes (default is 1) and whether to count canonical kmers (default is no). It inherits the fasta path from the 
+#main function at table = build_kmer_table(args.fasta, k=args.k, processes=args.processes, canonical=args.canonical) below where the first input is the fasta path specified by argparser variable "fasta" and the second input is the kmer size specified by argparser variable "k".
+def build_kmer_table(fasta_path: str, k: int = 3, processes: int = 1, canonical: bool = False) -> Union[Dict[int, int], "np.ndarray"]:
     """
     Build a k-mer table from a FASTA file.
+    Keys are k-mers packed 2 bits per base into an integer, A=0 C=1 G=2 T=3 (see _decode_kmers).
+    For k <= DENSE_MAX_K (with NumPy) the table is a dense array indexed by key, otherwise a dict of key: count.
+    With processes > 1, batches of records are counted in a multiprocessing pool and merged.
+    With canonical=True, each kmer is counted together with its reverse complement (see canonicalize_table).
+    """
+
+    if k < 1:
+        raise ValueError(f"k must be at least 1, got {k}")
+    method = _counting_method(k)
+    table = _new_table(method, k)
+
+    if processes > 1:
+        tasks = ((batch, k) for batch in _batches(fasta_path))
+        with multiprocessing.Pool(processes) as pool:
+            for partial in pool.imap_unordered(_count_batch, tasks):
+                _add_partial(table, partial, method)
+    else: #count each batch of joined records with one call of the counting loop.
+        for batch in _batches(fasta_path):
+            _count_codes(batch.translate(ENCODE), k, method, table)
+
+    #canonical counts are the forward counts folded together afterwards, so the counting loops stay the same.
+    if method == "jit":
+        keys, counts = _jit_items(table)
+        if canonical and keys.size:
+            keys, counts = _canonical_arrays(keys, counts, k)
+        return dict(zip(keys.tolist(), counts.tolist()))
+    if canonical:
+        table = canonicalize_table(table, k)
+    return table #return the table dict containing kmer counts.
+
+
+#largest number of bases decoded with one lookup into a precomputed list of kmer strings (4**8 = 65536 entries).
+DECODE_CHUNK = 8
+
+
+def _decode_kmers(keys, k: int) -> List[bytes]:
+    """
+    Turn 2-bit packed keys (a list of ints or a NumPy array) back into ACGT kmers, as bytes, for writing.
     """
+    if np is not None and k <= JIT_MAX_K: #map one base column of all keys to letters at a time with NumPy.
+        keys = np.asarray(keys, np.uint64)
+        letters = np.empty((keys.size, k), np.uint8)
+        acgt = np.frombuffer(b"ACGT", np.uint8)
+        for j in range(k):
+            letters[:, j] = acgt[(keys >> np.uint64(2 * (k - 1 - j))) & np.uint64(3)]
+        return letters.view(f"S{k}").ravel().tolist()
+    if k <= DECODE_CHUNK: #one lookup per kmer in a list of all 4**k strings, built in key order.
+        strings = [bytes(p) for p in product(b"ACGT", repeat=k)]
+        return [strings[key] for key in keys]
+    #join lookups of DECODE_CHUNK bases at a time, with the leftover bases in the first chunk.
+    first = k % DECODE_CHUNK or DECODE_CHUNK
+    first_strings = [bytes(p) for p in product(b"ACGT", repeat=first)]
+    strings = [bytes(p) for p in product(b"ACGT", repeat=DECODE_CHUNK)]
+    chunk_mask = (1 << (2 * DECODE_CHUNK)) - 1
+    shifts = range(2 * (k - first - DECODE_CHUNK), -1, -2 * DECODE_CHUNK)
+    return [first_strings[key >> (2 * (k - first))] + b"".join([strings[(key >> shift) & chunk_mask] for shift in shifts]) for key in keys]
+
 
-    #bases allowed can only be A, C, G, or T. Non-standard bases are skipped when they occur inside a k-mer.
-    allowed = set("ACGT")
-   
-    total = Counter() 
-    
-    for _, seq in parse_fasta(fasta_path):  
-        seq = seq.upper() 
-        for i in range(len(seq) - k + 1): 
-            kmer = seq[i : i + k] 
-            if set(kmer) <= allowed: 
-                total[kmer] += 1 
-    return total #return the total Counter object containing kmer counts.
+#number of kmers write_kmer_table decodes, formats and writes per f.write call.
+WRITE_CHUNK = 1 << 16
 
 
 #print_kmer_table function to be used below to print the kmer table in a tabular format.
-def write_kmer_table(counter: Counter, outfile: str): #takes an undefined Counter object as input and prints the kmer counts in a tabular format.
+def write_kmer_table(counter: Union[Dict[int, int], "np.ndarray"], outfile: str, k: int): #takes the packed kmer counts (dict or dense array) and the kmer size they were counted with, and prints the kmer counts in a tabular format.
     """
     Print a k-mer table in a simple tabular format: kmer\tcount
+    k must be the kmer size the table was built with; a table that cannot hold k-mers of that size raises ValueError.
     """
-    with open(outfile, "w") as f: #open the output file for writing.
-        for kmer, count in sorted(counter.items()): #unpacks each tuple in the counter object into kmer and count variables, sorts them alphabetically by kmer, and iterates through them.
-            f.write(f"{kmer}\t{count}\n") #write the kmer and count separated by a tab character to the output file.
+    #packed keys carry no length, so a wrong k would silently write the wrong kmers. Catch what can be caught.
+    if not isinstance(counter, dict):
+        if counter.size != 4 ** k:
+            raise ValueError(f"dense k-mer table has {counter.size} entries, expected 4**{k} = {4 ** k} for k={k}")
+    elif counter and max(counter) >= 4 ** k:
+        raise ValueError(f"k-mer table has keys too large for k={k}; was it built with a larger k?")
+    #packed keys sort in the same order as their kmer strings, since A < C < G < T.
+    if not isinstance(counter, dict): #dense array: the seen kmers are its nonzero positions, already in key order.
+        keys = np.flatnonzero(counter)
+        counts = counter[keys]
+    elif np is not None and k <= JIT_MAX_K: #sorting in NumPy is much faster than sorting millions of Python ints.
+        keys = np.fromiter(counter.keys(), np.uint64, len(counter))
+        counts = np.fromiter(counter.values(), np.int64, len(counter))
+        order = np.argsort(keys)
+        keys, counts = keys[order], counts[order]
+    else:
+        keys = sorted(counter)
+        counts = [counter[key] for key in keys]
+    #decode and format WRITE_CHUNK kmers at a time and write each chunk with a single call. This keeps the number
+    #of writes small without holding every kmer string and output line of a large table in memory at once.
+    with open(outfile, "wb") as f: #open the output file for writing in binary mode.
+        for start in range(0, len(keys), WRITE_CHUNK):
+            chunk_counts = counts[start : start + WRITE_CHUNK]
+            if not isinstance(chunk_counts, list):
+                chunk_counts = chunk_counts.tolist()
+            kmers = _decode_kmers(keys[start : start + WRITE_CHUNK], k)
+            f.write(b"".join([b"%s\t%d\n" % line for line in zip(kmers, chunk_counts)]))
 
 
-if __name__ == "__main__": #parser defines three arguments: fasta (positional), k (optional with default 3), and output (required).
+if __name__ == "__main__": #parser defines five arguments: fasta (positional), k (optional with default 3), output (required), processes (optional with default 1), and canonical (optional flag).
     parser = argparse.ArgumentParser(description="Build k-mer table from a FASTA file.")
     parser.add_argument("fasta", help="Input FASTA file")
     parser.add_argument("--k", type=int, default=3, help="k-mer size (default: 3)")
     parser.add_argument("--output", "-o", required=True, help="Output file for k-mer table, TSV format") 
+    parser.add_argument("--processes", "-p", type=int, default=1, help="Number of processes used to count records in parallel (default: 1)")
+    parser.add_argument("--canonical", action="store_true", help="Count each k-mer together with its reverse complement, reported under whichever sorts first")
     args = parser.parse_args()
+    if args.k < 1:
+        parser.error("--k must be >= 1")
 
-    table = build_kmer_table(args.fasta, k=args.k) #calls the build_kmer_table function and passes the fasta file path and kmer size to it, returning the table to the table variable.
-    write_kmer_table(table,args.output) #once the kmer table is built and the variable table contains it, table is passed to write_kmer_table to print.
+    table = build_kmer_table(args.fasta, k=args.k, processes=args.processes, canonical=args.canonical) #calls the build_kmer_table function and passes the fasta file path and kmer size to it, returning the table to the table variable.
+    write_kmer_table(table, args.output, k=args.k) #once the kmer table is built and the variable table contains it, table is passed to write_kmer_table to print.